@@ -1,15 +1,27 @@
 import os
+import re
+import html
+import math
+import sqlite3
+import subprocess
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 import gradio as gr
-import requests
-from contextlib import contextmanager
+import httpx
+import orjson
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
 import uuid
 import logging
-import speech_recognition as sr
-from moviepy import VideoFileClip
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -19,15 +31,93 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Number of chat handlers served at once, and of threads running their blocking work
+worker_concurrency = int(os.getenv('WORKER_CONCURRENCY', 64))
+
 # Initialize Flask app and SQLAlchemy
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///conversations.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'future': True,
+    'query_cache_size': 1200,  # Room for every compiled statement on the hot paths
+    'pool_pre_ping': True,
+    # Enough connections for every worker thread to hold one at once
+    'pool_size': 20,
+    'max_overflow': max(worker_concurrency - 20, 0),
+    'pool_recycle': 1800
+}
 db = SQLAlchemy(app)
 
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL on SQLite so readers don't block the writer under concurrent chats."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
+
 # Set Gemini API key
 gemini_api_key = ""  # Replace with your actual API key
-gemini_api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+gemini_stream_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:streamGenerateContent"
+
+# Long videos are transcribed as overlapping chunks in parallel threads; each worker
+# keeps faster-whisper's default of 4 compute threads, so workers share the cores
+transcription_cpu_threads = 4
+transcription_workers = int(os.getenv('TRANSCRIPTION_WORKERS', max(1, (os.cpu_count() or 1) // transcription_cpu_threads)))
+transcription_chunk_seconds = 30
+transcription_overlap_seconds = 2
+
+# Local speech-to-text model, loaded on first use and shared by every transcription
+_whisper_model = None
+_whisper_model_lock = threading.Lock()
+
+# Number of recent turns sent back to Gemini as conversation context
+max_context_turns = int(os.getenv('MAX_CONTEXT_TURNS', 20))
+
+# Replies to the opening message of a chat are reused when a character gets the
+# same opener again, compared ignoring case and whitespace
+response_cache_size = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+
+# Chat history listings are reused for up to this many seconds, for the most recent
+# users; saving a turn clears only that user's listing
+chat_history_ttl = 5
+chat_history_cache_size = 256
+
+# Chat history cards rendered per page; "Load More" adds another page
+chat_history_page_size = 30
+
+# Shared async HTTP client so concurrent chats reuse pooled keep-alive connections;
+# the transport retries failed connection attempts
+http_client = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        retries=3
+    ),
+    timeout=httpx.Timeout(60.0)
+)
+
+# Bounded pool for blocking database work so it never stalls the event loop
+blocking_executor = ThreadPoolExecutor(max_workers=worker_concurrency)
+
+gemini_headers = {
+    'Content-Type': 'application/json'
+}
+
+# Gemini responses worth retrying, with exponential backoff between attempts
+gemini_retry_statuses = {429, 500, 502, 503, 504}
+gemini_max_retries = 3
+gemini_backoff_factor = 0.3
+
+# Streamed replies are pushed to the browser at most once per interval (seconds)
+stream_flush_interval = 0.016
+
+# CSS and JS are served as static files so browsers can cache them between page loads
+static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+gr.set_static_paths(paths=[static_dir])
 
 # Database models
 class Character(db.Model):
@@ -38,6 +128,10 @@ class Character(db.Model):
 
 class Conversation(db.Model):
     __tablename__ = 'conversation'
+    __table_args__ = (
+        db.Index('ix_conv_user_chat_ts', 'user_id', 'chat_id', 'timestamp'),
+        db.Index('ix_conv_user_char_ts', 'user_id', 'character_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     character_id = db.Column(db.Integer, db.ForeignKey('character.id'), nullable=False)
@@ -47,11 +141,53 @@ class Conversation(db.Model):
     chat_id = db.Column(db.String(36), nullable=True)
     user_id = db.Column(db.Integer, nullable=False)
 
+# Character name -> (id, prompt prefix); the character set is small and rarely changes
+_character_cache = {}
+_character_cache_lock = threading.RLock()
+
 @contextmanager
 def app_context():
     with app.app_context():
         yield
 
+def cache_character(character):
+    with _character_cache_lock:
+        _character_cache[character.name] = (character.id, character.prompt_template + "\n")
+
+def get_cached_character(name):
+    """Return (id, prompt prefix) for a character, loading it on a cache miss."""
+    cached = _character_cache.get(name)
+    if cached is None:
+        character = Character.query.filter_by(name=name).first()
+        if character:
+            cache_character(character)
+            cached = _character_cache[name]
+    return cached
+
+# (character name, normalized opening message) -> reply, least recently used first
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def normalize_prompt(text):
+    return " ".join(text.lower().split())
+
+def get_cached_response(character_name, user_input):
+    """Return the cached reply to the same opening message, or None."""
+    key = (character_name, normalize_prompt(user_input))
+    with _response_cache_lock:
+        bot_response = _response_cache.get(key)
+        if bot_response is not None:
+            _response_cache.move_to_end(key)
+        return bot_response
+
+def cache_response(character_name, user_input, bot_response):
+    key = (character_name, normalize_prompt(user_input))
+    with _response_cache_lock:
+        _response_cache[key] = bot_response
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > response_cache_size:
+            _response_cache.popitem(last=False)
+
 def add_predefined_characters():
     with app_context():
         characters = [
@@ -72,22 +208,26 @@ def add_predefined_characters():
             }
         ]
 
-        for char_data in characters:
-            if not Character.query.filter_by(name=char_data["name"]).first():
-                new_character = Character(
-                    name=char_data["name"],
-                    description=char_data["description"],
-                    prompt_template=char_data["prompt_template"]
-                )
-                db.session.add(new_character)
-                logger.info(f"Adding predefined character: {char_data['name']}")
+        # One query checks which predefined names already exist
+        existing_names = set(db.session.scalars(
+            db.select(Character.name).where(Character.name.in_([char_data["name"] for char_data in characters]))
+        ).all())
+        missing = [char_data for char_data in characters if char_data["name"] not in existing_names]
         
         try:
+            if missing:
+                # One bulk INSERT instead of building an ORM object per row
+                db.session.execute(db.insert(Character), missing)
+                for char_data in missing:
+                    logger.info(f"Adding predefined character: {char_data['name']}")
             db.session.commit()
         except Exception as e:
             db.session.rollback()
             logger.error(f"Error adding predefined characters: {e}")
 
+        for character in Character.query.all():
+            cache_character(character)
+
 def add_character(name, description, prompt_template):
     with app_context():
         try:
@@ -101,6 +241,7 @@ def add_character(name, description, prompt_template):
             )
             db.session.add(new_character)
             db.session.commit()
+            cache_character(new_character)
             logger.info(f"Successfully added character: {name}")
             return f"Character '{name}' added successfully!\nDescription: {description}"
         
@@ -118,788 +259,422 @@ def get_existing_characters():
             logger.error(f"Error retrieving characters: {e}")
             return [("Error retrieving characters", str(e))]
 
-def chat_with_character(character_name, user_input, user_id, chat_id=None):
+def select_recent_turns(limit, *criteria):
+    """Build a query for the newest `limit` matching turns, returned oldest first."""
+    # The inner query walks the (user, chat/character, timestamp) index backwards and
+    # stops after `limit` rows; the outer query puts them back in chronological order
+    recent = db.select(Conversation.user_input, Conversation.bot_response, Conversation.timestamp)\
+        .where(*criteria)\
+        .order_by(Conversation.timestamp.desc())\
+        .limit(limit)\
+        .subquery()
+    return db.select(recent.c.user_input, recent.c.bot_response).order_by(recent.c.timestamp)
+
+def load_chat_context(character_name, user_id, chat_id):
+    """Look up the character and build the conversation context for a chat turn."""
     with app_context():
-        try:
-            character = Character.query.filter_by(name=character_name).first()
-            
-            if not character:
-                return "Character not found.", None
-            
-            if not chat_id:
-                chat_id = str(uuid.uuid4())
-            
-            # Get previous conversations for this chat_id if it exists
-            previous_conversations = []
-            if chat_id:
-                previous_conversations = Conversation.query.filter_by(
-                    user_id=user_id, 
-                    chat_id=chat_id
-                ).order_by(Conversation.timestamp).all()
-            else:
-                # If no chat_id, get recent conversations for this user with this character
-                previous_conversations = Conversation.query.filter_by(
-                    user_id=user_id,
-                    character_id=character.id
-                ).order_by(Conversation.timestamp.desc()).limit(10).all()
-                previous_conversations.reverse()  # Most recent last
-            
-            context_prompt = " ".join([f"User: {conv.user_input}\nBot: {conv.bot_response}" for conv in previous_conversations])
-            prompt_template = character.prompt_template
-            full_prompt = f"{prompt_template}\n{context_prompt}\nUser: {user_input}\nBot:"
-
-            payload = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}]
-                }]
-            }
+        character = get_cached_character(character_name)
+        
+        if not character:
+            return None
+        
+        character_id, prompt_prefix = character
+        
+        # Get the most recent turns for this chat_id if it exists.
+        # Only the two text columns are needed, so skip ORM object loading.
+        if chat_id:
+            recent_turns = select_recent_turns(
+                max_context_turns,
+                Conversation.user_id == user_id,
+                Conversation.chat_id == chat_id
+            )
+        else:
+            # If no chat_id, get recent conversations for this user with this character
+            recent_turns = select_recent_turns(
+                10,
+                Conversation.user_id == user_id,
+                Conversation.character_id == character_id
+            )
+        previous_conversations = db.session.execute(recent_turns).all()
+        
+        # Append the pieces and join once instead of formatting a string per turn
+        parts = []
+        append = parts.append
+        for turn_input, turn_response in previous_conversations:
+            if parts:
+                append(" ")
+            append("User: ")
+            append(turn_input or "")
+            append("\nBot: ")
+            append(turn_response)
+        context_prompt = "".join(parts)
+        return character_id, prompt_prefix, context_prompt
+
+def save_conversation(character_id, user_input, bot_response, chat_id, user_id):
+    """Persist a single chat turn."""
+    with app_context():
+        conversation = Conversation(
+            character_id=character_id,
+            user_input=user_input,
+            bot_response=bot_response,
+            chat_id=chat_id,
+            user_id=user_id
+        )
+        db.session.add(conversation)
+        db.session.commit()
+        invalidate_chat_history(user_id)
+        logger.info(f"Saved conversation with chat_id: {chat_id}")
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the shared worker pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, func, *args)
+
+@asynccontextmanager
+async def stream_gemini(payload):
+    """Open a server-sent event stream from Gemini, retrying rate limits and transient server errors with backoff."""
+    # Serialize once with orjson, straight to bytes, and reuse the body across retries
+    body = orjson.dumps(payload)
+    for attempt in range(gemini_max_retries + 1):
+        request = http_client.build_request(
+            'POST',
+            gemini_stream_url,
+            headers=gemini_headers,
+            content=body,
+            params={'key': gemini_api_key, 'alt': 'sse'}
+        )
+        response = await http_client.send(request, stream=True)
+        if response.status_code not in gemini_retry_statuses or attempt == gemini_max_retries:
+            break
+        await response.aclose()
+        logger.warning(f"Gemini API returned {response.status_code}, retrying")
+        await asyncio.sleep(gemini_backoff_factor * 2 ** attempt)
+    try:
+        yield response
+    finally:
+        await response.aclose()
 
-            headers = {
-                'Content-Type': 'application/json'
-            }
+async def chat_with_character_stream(character_name, user_input, user_id, chat_id):
+    """Yield the reply in text chunks as Gemini generates it, then save the full turn."""
+    chunks = []
+    try:
+        chat_context = await run_blocking(load_chat_context, character_name, user_id, chat_id)
+        
+        if chat_context is None:
+            yield "Character not found."
+            return
+        
+        character_id, prompt_prefix, context_prompt = chat_context
+        
+        # With no earlier turns the reply depends only on the character and the message
+        cacheable = not context_prompt
+        if cacheable:
+            bot_response = get_cached_response(character_name, user_input)
+            if bot_response is not None:
+                await run_blocking(save_conversation, character_id, user_input, bot_response, chat_id, user_id)
+                yield bot_response
+                return
+        
+        full_prompt = f"{prompt_prefix}{context_prompt}\nUser: {user_input}\nBot:"
 
-            response = requests.post(
-                gemini_api_url,
-                headers=headers,
-                json=payload,
-                params={'key': gemini_api_key}
-            )
+        payload = {
+            "contents": [{
+                "parts": [{"text": full_prompt}]
+            }]
+        }
 
-            if response.status_code == 200:
-                response_data = response.json()
-                if 'candidates' in response_data and len(response_data['candidates']) > 0:
-                    bot_response = response_data['candidates'][0]['content']['parts'][0]['text']
-                    
-                    conversation = Conversation(
-                        character_id=character.id,
-                        user_input=user_input,
-                        bot_response=bot_response,
-                        chat_id=chat_id,
-                        user_id=user_id
-                    )
-                    db.session.add(conversation)
-                    db.session.commit()
-                    logger.info(f"Saved conversation with chat_id: {chat_id}")
-                    return bot_response, chat_id
-                else:
-                    return "An error occurred while generating content: Unexpected response format.", chat_id
-            else:
-                logger.error(f"Error from Gemini API: {response.json()}")
-                return f"An error occurred while generating content: {response.status_code} - {response.text}", chat_id
+        async with stream_gemini(payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.error(f"Error from Gemini API: {response.text}")
+                yield f"An error occurred while generating content: {response.status_code} - {response.text}"
+                return
+            
+            # Each event carries the next piece of the candidate's text
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                candidates = orjson.loads(line[5:]).get('candidates')
+                if not candidates:
+                    continue
+                for part in candidates[0].get('content', {}).get('parts', ()):
+                    text = part.get('text')
+                    if text:
+                        chunks.append(text)
+                        yield text
+
+        if not chunks:
+            yield "An error occurred while generating content: Unexpected response format."
+            return
+        
+        bot_response = "".join(chunks)
+        if cacheable:
+            cache_response(character_name, user_input, bot_response)
+        await run_blocking(save_conversation, character_id, user_input, bot_response, chat_id, user_id)
 
-        except Exception as e:
-            logger.error(f"Unexpected error in chat_with_character: {e}")
-            return f"An unexpected error occurred: {str(e)}", chat_id
+    except Exception as e:
+        logger.error(f"Unexpected error in chat_with_character_stream: {e}")
+        if chunks:
+            # Part of the reply is already out; report the failure on its own line
+            yield f"\n\n[Error: {e}]"
+        else:
+            yield f"An unexpected error occurred: {str(e)}"
+
+async def chat_with_character(character_name, user_input, user_id, chat_id=None):
+    """Run one chat turn to completion and return the full reply with its chat ID."""
+    if not chat_id:
+        chat_id = str(uuid.uuid4())
+    chunks = [chunk async for chunk in chat_with_character_stream(character_name, user_input, user_id, chat_id)]
+    return "".join(chunks), chat_id
+
+async def chat_batch(messages):
+    """Run independent (character_name, user_input, user_id, chat_id) turns concurrently."""
+    return await asyncio.gather(*[chat_with_character(*message) for message in messages])
+
+def get_whisper_model():
+    """Load the whisper model on first use so workers that never transcribe skip the cost."""
+    global _whisper_model
+    if _whisper_model is None:
+        with _whisper_model_lock:
+            if _whisper_model is None:
+                from faster_whisper import WhisperModel
+                # One worker per thread lets chunk transcriptions run in parallel on shared weights,
+                # while single-pass transcriptions still get the full thread count
+                _whisper_model = WhisperModel(os.getenv('WHISPER_MODEL', 'base'), device='cpu', compute_type='int8',
+                                              num_workers=transcription_workers,
+                                              cpu_threads=transcription_cpu_threads)
+    return _whisper_model
 
 def speech_to_text(audio_file):
-    """Convert audio file to text using SpeechRecognition."""
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(audio_file) as source:
-        audio_data = recognizer.record(source)
-        try:
-            text = recognizer.recognize_google(audio_data)
-            logger.info(f"Transcribed text: {text}")
-            return text
-        except sr.UnknownValueError:
-            logger.error("Could not understand audio")
-            return "Could not understand audio"
-        except sr.RequestError as e:
-            logger.error(f"Could not request results from Google Speech Recognition service; {e}")
-            return f"Error: {str(e)}"
-
-def extract_audio_from_video(video_file):
-    """Extract audio from video and return the audio file path."""
-    audio_file_path = "temp_audio.wav"  # Temporary file name
+    """Convert an audio file path or array of 16 kHz samples to text using faster-whisper."""
     try:
-        with VideoFileClip(video_file) as video:
-            video.audio.write_audiofile(audio_file_path)
-        logger.info(f"Extracted audio to {audio_file_path}")
-        return audio_file_path
+        segments, _ = get_whisper_model().transcribe(audio_file)
+        text = " ".join(segment.text.strip() for segment in segments).strip()
     except Exception as e:
+        logger.error(f"Error transcribing audio: {e}")
+        return f"Error: {str(e)}"
+    
+    if not text:
+        logger.error("Could not understand audio")
+        return "Could not understand audio"
+    
+    logger.info(f"Transcribed text: {text}")
+    return text
+
+def get_media_duration(media_file):
+    """Return the duration of a media file in seconds using ffprobe, or None if unknown."""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', media_file],
+            capture_output=True,
+            check=True,
+            text=True
+        )
+        return float(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logger.error(f"Error probing media duration: {e}")
+        return None
+
+def extract_audio_from_video(video_file, start=None, duration=None):
+    """Extract audio from video with ffmpeg as 16 kHz mono float32 samples, without touching disk."""
+    import numpy as np
+    
+    seek_args = []
+    if start is not None:
+        seek_args += ['-ss', str(start)]
+    if duration is not None:
+        seek_args += ['-t', str(duration)]
+    
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-nostdin', *seek_args, '-i', video_file, '-vn', '-ac', '1', '-ar', '16000',
+             '-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1'],
+            capture_output=True,
+            check=True
+        )
+        # Raw PCM goes straight to whisper, so there is no container to write or re-parse
+        samples = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+        logger.info(f"Extracted {len(samples) / 16000:.1f}s of audio from {video_file}")
+        return samples
+    except (OSError, subprocess.CalledProcessError) as e:
         logger.error(f"Error extracting audio from video: {e}")
         return None  # Return None if there's an error
 
+def transcribe_video_chunk(video_file, index, chunk_count):
+    """Transcribe one overlapping chunk of a video, keeping only the segments it owns."""
+    audio = extract_audio_from_video(
+        video_file,
+        start=index * transcription_chunk_seconds,
+        duration=transcription_chunk_seconds + transcription_overlap_seconds
+    )
+    if audio is None:
+        return None
+    
+    # Neighbouring chunks share the overlap; split ownership at its midpoint so
+    # each segment is kept exactly once
+    owned_from = 0 if index == 0 else transcription_overlap_seconds / 2
+    owned_until = math.inf if index == chunk_count - 1 else transcription_chunk_seconds + transcription_overlap_seconds / 2
+    
+    segments, _ = get_whisper_model().transcribe(audio)
+    return [segment.text.strip() for segment in segments if owned_from <= segment.start < owned_until]
+
 def process_video(video_file):
-    """Process video file to extract text."""
-    audio_file = extract_audio_from_video(video_file)
-    if audio_file:
-        text = speech_to_text(audio_file)
-        # Clean up the temporary file
-        try:
-            os.remove(audio_file)
-        except:
-            pass
-        return text
-    return "Failed to process video"
+    """Process video file to extract text, transcribing long videos in parallel chunks."""
+    duration = get_media_duration(video_file)
+    if duration is None or duration <= transcription_chunk_seconds + transcription_overlap_seconds:
+        audio = extract_audio_from_video(video_file)
+        if audio is not None:
+            return speech_to_text(audio)
+        return "Failed to process video"
+    
+    chunk_count = math.ceil((duration - transcription_overlap_seconds) / transcription_chunk_seconds)
+    try:
+        with ThreadPoolExecutor(max_workers=transcription_workers) as executor:
+            chunks = list(executor.map(partial(transcribe_video_chunk, video_file, chunk_count=chunk_count),
+                                       range(chunk_count)))
+    except Exception as e:
+        logger.error(f"Error transcribing video: {e}")
+        return f"Error: {str(e)}"
+    
+    if any(chunk is None for chunk in chunks):
+        return "Failed to process video"
+    
+    text = " ".join(segment_text for chunk in chunks for segment_text in chunk).strip()
+    if not text:
+        logger.error("Could not understand audio")
+        return "Could not understand audio"
+    
+    logger.info(f"Transcribed text: {text}")
+    return text
+
+# User ID -> (expiry time, history rows), oldest first
+_chat_history_cache = {}
+# User ID -> number of turns saved, so a listing read before a save is never cached after it
+_chat_history_versions = {}
+_chat_history_lock = threading.Lock()
+
+def invalidate_chat_history(user_id):
+    """Drop one user's cached history listing after they save a turn."""
+    key = str(user_id)
+    with _chat_history_lock:
+        _chat_history_versions[key] = _chat_history_versions.get(key, 0) + 1
+        _chat_history_cache.pop(key, None)
 
 def get_chat_history(user_id):
-    """Retrieve chat history for a specific user ID."""
+    """Retrieve chat history for a specific user ID, reusing it for chat_history_ttl seconds."""
+    key = str(user_id)
+    now = time.monotonic()
+    with _chat_history_lock:
+        cached = _chat_history_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        version = _chat_history_versions.get(key, 0)
+    
+    result = query_chat_history(user_id)
+    
+    with _chat_history_lock:
+        if _chat_history_versions.get(key, 0) == version:
+            _chat_history_cache.pop(key, None)
+            _chat_history_cache[key] = (now + chat_history_ttl, result)
+            if len(_chat_history_cache) > chat_history_cache_size:
+                del _chat_history_cache[next(iter(_chat_history_cache))]
+    return result
+
+def query_chat_history(user_id):
     with app_context():
-        # Get unique chat sessions
-        chat_sessions = db.session.query(Conversation.chat_id, Character.name, 
-                                        db.func.min(Conversation.timestamp).label('start_time'))\
-            .join(Character, Conversation.character_id == Character.id)\
-            .filter(Conversation.user_id == user_id)\
-            .group_by(Conversation.chat_id)\
-            .order_by(db.text('start_time DESC'))\
+        # Rank each session's messages so the first one, the start time and the
+        # message count all come back from a single query
+        ranked = db.session.query(
+            Conversation.chat_id.label('chat_id'),
+            Conversation.character_id.label('character_id'),
+            Conversation.user_input.label('user_input'),
+            Conversation.timestamp.label('start_time'),
+            db.func.count(Conversation.id).over(
+                partition_by=Conversation.chat_id
+            ).label('message_count'),
+            db.func.row_number().over(
+                partition_by=Conversation.chat_id,
+                order_by=(Conversation.timestamp, Conversation.id)
+            ).label('position')
+        ).filter(Conversation.user_id == user_id).subquery()
+
+        chat_sessions = db.session.query(ranked.c.chat_id, Character.name, ranked.c.user_input,
+                                         ranked.c.start_time, ranked.c.message_count)\
+            .join(Character, ranked.c.character_id == Character.id)\
+            .filter(ranked.c.position == 1)\
+            .order_by(ranked.c.start_time.desc())\
             .all()
         
         result = []
-        for chat_id, character_name, start_time in chat_sessions:
-            # Get the first message from each conversation to use as a title
-            first_message = Conversation.query.filter_by(
-                chat_id=chat_id, 
-                user_id=user_id
-            ).order_by(Conversation.timestamp).first()
-            
-            if first_message:
-                # Calculate message count
-                message_count = Conversation.query.filter_by(
-                    chat_id=chat_id,
-                    user_id=user_id
-                ).count()
-                
-                formatted_date = start_time.strftime("%Y-%m-%d %H:%M:%S")
-                preview = first_message.user_input[:30] + "..." if len(first_message.user_input) > 30 else first_message.user_input
-                result.append((chat_id, character_name, preview, formatted_date, message_count))
+        for chat_id, character_name, first_input, start_time, message_count in chat_sessions:
+            formatted_date = start_time.strftime("%Y-%m-%d %H:%M:%S")
+            preview = first_input[:30] + "..." if len(first_input) > 30 else first_input
+            result.append((chat_id, character_name, preview, formatted_date, message_count))
                 
         return result
 
 def get_chat_messages(chat_id, user_id):
     """Get all messages for a specific chat session."""
     with app_context():
-        messages = Conversation.query.filter_by(
-            chat_id=chat_id, 
-            user_id=user_id
-        ).order_by(Conversation.timestamp).all()
-        
-        return [(msg.user_input, msg.bot_response) for msg in messages]
+        messages = db.session.execute(
+            db.select(Conversation.user_input, Conversation.bot_response)
+            .where(Conversation.chat_id == chat_id, Conversation.user_id == user_id)
+            .order_by(Conversation.timestamp)
+        ).all()
+        
+        return [(user_input, bot_response) for user_input, bot_response in messages]
+
+# Keywords that pick a character, in priority order
+character_keywords = [
+    ("Professor Sage", frozenset({"learn", "study", "education", "knowledge", "science", "history", "math", "theory", "research"})),
+    ("Chuck the Clown", frozenset({"joke", "funny", "laugh", "entertain", "comedy", "silly"})),
+    ("Sarcastic Pirate", frozenset({"adventure", "sea", "pirate", "treasure", "sail", "voyage"})),
+]
+_keyword_ranks = {keyword: rank for rank, (_, keywords) in enumerate(character_keywords) for keyword in keywords}
+# One compiled pattern matches every keyword in a single pass; the lookahead
+# also reports overlapping keywords (e.g. "sea" inside "research"). It is
+# case-sensitive and run on lowercased input, so every match is a dict key.
+_keyword_pattern = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in sorted(_keyword_ranks, key=lambda k: (_keyword_ranks[k], k))) + "))"
+)
 
 def auto_select_character(user_input):
-    user_input = user_input.lower()
-    
-    education_keywords = ["learn", "study", "education", "knowledge", "science", "history", "math", "theory", "research"]
-    entertainment_keywords = ["joke", "funny", "laugh", "entertain", "comedy", "silly"]
-    adventure_keywords = ["adventure", "sea", "pirate", "treasure", "sail", "voyage"]
+    best_rank = None
+    for match in _keyword_pattern.finditer(user_input.lower()):
+        rank = _keyword_ranks[match.group(1)]
+        if best_rank is None or rank < best_rank:
+            best_rank = rank
+            if rank == 0:
+                break  # Nothing outranks the first character, stop scanning
     
-    if any(keyword in user_input for keyword in education_keywords):
-        return "Professor Sage"
-    elif any(keyword in user_input for keyword in entertainment_keywords):
-        return "Chuck the Clown"
-    elif any(keyword in user_input for keyword in adventure_keywords):
-        return "Sarcastic Pirate"
-    
-    return None
+    if best_rank is None:
+        return None
+    return character_keywords[best_rank][0]
+
+# Markup for one chat history card, filled in by format_chat_history
+chat_history_card_template = """
+<div class='chat-history-card' data-chat-id='{chat_id}'>
+    <div class='chat-history-badge'>{msg_count} messages</div>
+    <h3>{character}</h3>
+    <p><strong>Started:</strong> {date}</p>
+    <p><strong>First message:</strong> {preview}</p>
+</div>
+"""
+chat_history_header = "<div class='chat-history-container'>"
+chat_history_footer = "</div>"
+
+def static_url(filename):
+    """URL of a file in static/, versioned by mtime so browser caches refresh on change."""
+    path = os.path.join(static_dir, filename)
+    return f"/gradio_api/file={path}?v={int(os.path.getmtime(path))}"
 
 def create_interface():
-    with app.app_context():
-        add_predefined_characters()  # Add predefined characters if needed
+    existing_characters = get_existing_characters()  # Shared by the admin list and the chat dropdown
     
-    with gr.Blocks(title="Character Chat System", theme=gr.themes.Base(), css="""
-        :root {
-            --main-color: #4A90E2;
-            --accent-color: #FF6B6B;
-            --bg-color: #1a1a2e;
-            --text-color: #f1f1f1;
-            --card-bg: #16213e;
-            --border-color: #0f3460;
-        }
-        
-        body {
-            background: var(--bg-color);
-            color: var(--text-color);
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            margin: 0;
-            padding: 0;
-            transition: all 0.3s ease;
-        }
-        
-        /* Animated background */
-        body::before {
-            content: "";
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(125deg, #1a1a2e 0%, #16213e 30%, #0f3460 70%, #1a1a2e 100%);
-            background-size: 400% 400%;
-            z-index: -1;
-            animation: gradient 15s ease infinite;
-        }
-        
-        @keyframes gradient {
-            0% { background-position: 0% 50%; }
-            50% { background-position: 100% 50%; }
-            100% { background-position: 0% 50%; }
-        }
-        
-        /* Floating particles */
-        .particle {
-            position: fixed;
-            border-radius: 50%;
-            opacity: 0.3;
-            pointer-events: none;
-            z-index: -1;
-            animation: float 20s infinite linear;
-        }
-        
-        @keyframes float {
-            0% { transform: translateY(0) rotate(0deg); }
-            100% { transform: translateY(-100vh) rotate(360deg); }
-        }
-        
-        /* Generate 20 particles */
-        .gradio-container::before {
-            content: "";
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            pointer-events: none;
-            z-index: -1;
-        }
-        
-        #title {
-            text-align: center;
-            font-size: 3.5em;
-            font-weight: 700;
-            background: linear-gradient(90deg, var(--main-color), var(--accent-color), var(--main-color));
-            background-size: 200% auto;
-            color: transparent;
-            -webkit-background-clip: text;
-            background-clip: text;
-            animation: shine 3s linear infinite;
-            margin-bottom: 30px;
-            text-shadow: 0 0 10px rgba(74, 144, 226, 0.3);
-            letter-spacing: 1px;
-        }
-        
-        @keyframes shine {
-            to {
-                background-position: 200% center;
-            }
-        }
-        
-        .gradio-container {
-            max-width: 90% !important;
-            margin: 20px auto !important;
-            border-radius: 15px !important;
-            background: rgba(22, 33, 62, 0.8) !important;
-            backdrop-filter: blur(10px) !important;
-            border: 1px solid var(--border-color) !important;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3) !important;
-            padding: 30px !important;
-            overflow: hidden !important;
-            position: relative !important;
-        }
-        
-        .gradio-container::after {
-            content: "";
-            position: absolute;
-            inset: 0;
-            border-radius: 15px;
-            padding: 2px;
-            background: linear-gradient(45deg, var(--main-color), var(--accent-color));
-            mask: linear-gradient(#fff 0 0) content-box, linear-gradient(#fff 0 0);
-            -webkit-mask-composite: xor;
-            mask-composite: exclude;
-            pointer-events: none;
-            z-index: -1;
-        }
-        
-        /* Tabs styling */
-        .tabs {
-            background: var(--card-bg) !important;
-            border-radius: 10px !important;
-            overflow: hidden !important;
-            margin-bottom: 20px !important;
-        }
-        
-        .tab-nav {
-            background: var(--card-bg) !important;
-            border-bottom: 1px solid var(--border-color) !important;
-        }
-        
-        .tab-nav button {
-            color: var(--text-color) !important;
-            font-weight: 600 !important;
-            padding: 12px 20px !important;
-            border-radius: 0 !important;
-            transition: all 0.3s !important;
-            position: relative !important;
-            overflow: hidden !important;
-        }
-        
-        .tab-nav button::before {
-            content: "";
-            position: absolute;
-            bottom: 0;
-            left: 50%;
-            width: 0;
-            height: 3px;
-            background: linear-gradient(to right, var(--main-color), var(--accent-color));
-            transform: translateX(-50%);
-            transition: width 0.3s;
-        }
-        
-        .tab-nav button:hover::before,
-        .tab-nav button.selected::before {
-            width: 80%;
-        }
-        
-        .tab-nav button.selected {
-            color: white !important;
-            background: transparent !important;
-        }
-        
-        /* Form elements styling */
-        input[type="text"], 
-        input[type="password"], 
-        textarea, 
-        select,
-        .gr-input,
-        .gr-box,
-        .gr-padded {
-            background: rgba(15, 25, 50, 0.7) !important;
-            border: 1px solid var(--border-color) !important;
-            border-radius: 8px !important;
-            padding: 12px !important;
-            color: var(--text-color) !important;
-            transition: all 0.3s !important;
-            box-shadow: inset 0 2px 4px rgba(0, 0, 0, 0.2) !important;
-        }
-        
-        input[type="text"]:focus, 
-        input[type="password"]:focus, 
-        textarea:focus, 
-        select:focus,
-        .gr-input:focus {
-            border-color: var(--main-color) !important;
-            box-shadow: 0 0 0 2px rgba(74, 144, 226, 0.3) !important;
-            outline: none !important;
-        }
-        
-        /* Button styling */
-        .gr-button,
-        button {
-            background: linear-gradient(45deg, var(--main-color), #357ABD) !important;
-            color: white !important;
-            border: none !important;
-            border-radius: 8px !important;
-            padding: 12px 24px !important;
-            font-weight: 600 !important;
-            letter-spacing: 0.5px !important;
-            transition: all 0.3s ease !important;
-            box-shadow: 0 4px 15px rgba(74, 144, 226, 0.3) !important;
-            position: relative !important;
-            overflow: hidden !important;
-        }
-        
-        .gr-button:hover,
-        button:hover {
-            background: linear-gradient(45deg, #357ABD, var(--main-color)) !important;
-            transform: translateY(-2px) !important;
-            box-shadow: 0 6px 20px rgba(74, 144, 226, 0.4) !important;
-        }
-        
-        .gr-button:active,
-        button:active {
-            transform: translateY(1px) !important;
-            box-shadow: 0 2px 10px rgba(74, 144, 226, 0.3) !important;
-        }
-        
-        .gr-button::before,
-        button::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(90deg, transparent, rgba(255,255,255,0.2), transparent);
-            transition: all 0.4s;
-        }
-        
-        .gr-button:hover::before,
-        button:hover::before {
-            left: 100%;
-        }
-        
-        /* Primary button */
-        .gr-button.gr-button-primary {
-            background: linear-gradient(45deg, var(--accent-color), #E85D5D) !important;
-            box-shadow: 0 4px 15px rgba(255, 107, 107, 0.3) !important;
-        }
-        
-        .gr-button.gr-button-primary:hover {
-            background: linear-gradient(45deg, #E85D5D, var(--accent-color)) !important;
-            box-shadow: 0 6px 20px rgba(255, 107, 107, 0.4) !important;
-        }
-        
-        /* Chatbot styling */
-        .gr-chatbot {
-            background: var(--card-bg) !important;
-            border-radius: 12px !important;
-            border: 1px solid var(--border-color) !important;
-            padding: 0 !important;
-            min-height: 400px !important;
-            max-height: 600px !important;
-            overflow-y: auto !important;
-            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.2) !important;
-            margin-bottom: 20px !important;
-        }
-        
-        .gr-chatbot .message {
-            padding: 12px 16px !important;
-            margin: 8px !important;
-            border-radius: 10px !important;
-            position: relative !important;
-            max-width: 80% !important;
-            animation: message-fade-in 0.3s ease !important;
-        }
-        
-        @keyframes message-fade-in {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        
-        .gr-chatbot .user-message {
-            background: linear-gradient(135deg, var(--main-color), #357ABD) !important;
-            color: white !important;
-            border-radius: 12px 12px 0 12px !important;
-            align-self: flex-end !important;
-            margin-left: auto !important;
-            box-shadow: 0 2px 10px rgba(74, 144, 226, 0.3) !important;
-        }
-        
-        .gr-chatbot .bot-message {
-            background: var(--card-bg) !important;
-            color: var(--text-color) !important;
-            border: 1px solid var(--border-color) !important;
-            border-radius: 12px 12px 12px 0 !important;
-            margin-right: auto !important;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1) !important;
-        }
-        
-        /* Chat typing indicator */
-        .typing-indicator {
-            display: inline-block;
-            padding: 6px 12px;
-            background: var(--card-bg);
-            border-radius: 20px;
-            margin: 10px;
-        }
-        
-        .typing-indicator span {
-            height: 10px;
-            width: 10px;
-            float: left;
-            margin: 0 1px;
-            background-color: #9E9EA1;
-            display: block;
-            border-radius: 50%;
-            opacity: 0.4;
-        }
-        
-        .typing-indicator span:nth-of-type(1) {
-            animation: typing 1s infinite 0s;
-        }
-        
-        .typing-indicator span:nth-of-type(2) {
-            animation: typing 1s infinite 0.2s;
-        }
-        
-        .typing-indicator span:nth-of-type(3) {
-            animation: typing 1s infinite 0.4s;
-        }
-        
-        @keyframes typing {
-            0% { transform: translateY(0px); }
-            33% { transform: translateY(-5px); }
-            66% { transform: translateY(0px); }
-        }
-        
-        /* Dataframe styling */
-        table.dataframe {
-            width: 100% !important;
-            border-collapse: separate !important;
-            border-spacing: 0 !important;
-            border-radius: 10px !important;
-            overflow: hidden !important;
-            box-shadow: 0 4px 15px rgba(0, 0, 0, 0.1) !important;
-            margin: 20px 0 !important;
-            background: var(--card-bg) !important;
-            border: 1px solid var(--border-color) !important;
-        }
-        
-        table.dataframe th {
-            background: rgba(74, 144, 226, 0.2) !important;
-            color: var(--text-color) !important;
-            padding: 12px 15px !important;
-            font-weight: 600 !important;
-            text-align: left !important;
-            border-bottom: 2px solid var(--border-color) !important;
-            position: relative !important;
-        }
-        
-        table.dataframe td {
-            padding: 12px 15px !important;
-            border-bottom: 1px solid var(--border-color) !important;
-            color: var(--text-color) !important;
-            transition: all 0.2s !important;
-        }
-        
-        table.dataframe tr:hover td {
-            background: rgba(74, 144, 226, 0.05) !important;
-        }
-        
-        table.dataframe tr:last-child td {
-            border-bottom: none !important;
-        }
-        
-        /* Scrollbar styling */
-        ::-webkit-scrollbar {
-            width: 8px;
-            height: 8px;
-        }
-        
-        ::-webkit-scrollbar-track {
-            background: var(--card-bg);
-            border-radius: 10px;
-        }
-        
-        ::-webkit-scrollbar-thumb {
-            background: var(--border-color);
-            border-radius: 10px;
-            transition: all 0.3s;
-        }
-        
-        ::-webkit-scrollbar-thumb:hover {
-            background: var(--main-color);
-        }
-        
-        /* Chat history cards */
-        .chat-history-card {
-            background: var(--card-bg);
-            border: 1px solid var(--border-color);
-            border-radius: 10px;
-            padding: 15px;
-            margin-bottom: 15px;
-            cursor: pointer;
-            transition: all 0.3s;
-            position: relative;
-            overflow: hidden;
-        }
-        
-        .chat-history-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 10px 20px rgba(0, 0, 0, 0.2);
-            border-color: var(--main-color);
-        }
-        
-        .chat-history-card::before {
-            content: "";
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 5px;
-            height: 100%;
-            background: linear-gradient(to bottom, var(--main-color), var(--accent-color));
-        }
-        
-        .chat-history-card h3 {
-            margin-top: 0;
-            color: white;
-            font-size: 1.2em;
-        }
-        
-        .chat-history-card p {
-            margin: 5px 0;
-            color: #ccc;
-        }
-        
-        .chat-history-badge {
-            position: absolute;
-            top: 10px;
-            right: 10px;
-            background: var(--main-color);
-            color: white;
-            padding: 2px 8px;
-            border-radius: 12px;
-            font-size: 0.8em;
-        }
-        
-        /* Audio/Video recording styles */
-        .media-recorder {
-            background: var(--card-bg) !important;
-            border: 1px solid var(--border-color) !important;
-            border-radius: 10px !important;
-            padding: 15px !important;
-            margin-bottom: 15px !important;
-        }
-        
-        .media-recorder .recording-indicator {
-            width: 20px;
-            height: 20px;
-            border-radius: 50%;
-            background: var(--accent-color);
-            display: inline-block;
-            margin-right: 10px;
-            animation: pulse-recording 1.5s infinite;
-        }
-        
-        @keyframes pulse-recording {
-            0% { transform: scale(1); opacity: 1; }
-            50% { transform: scale(1.2); opacity: 0.5; }
-            100% { transform: scale(1); opacity: 1; }
-        }
-        
-        /* Animated emoji */
-        .blinking-emoji {
-            display: inline-block;
-            animation: pulse 1.5s infinite;
-        }
-        
-        @keyframes pulse {
-            0% { transform: scale(1); }
-            50% { transform: scale(1.2); }
-            100% { transform: scale(1); }
-        }
-        
-        /* Loading animation */
-        .loading-animation {
-            width: 60px;
-            height: 60px;
-            margin: 20px auto;
-            position: relative;
-        }
-        
-        .loading-animation div {
-            position: absolute;
-            width: 16px;
-            height: 16px;
-            border-radius: 50%;
-            background: var(--main-color);
-            animation: loading-animation 1.2s linear infinite;
-        }
-        
-        .loading-animation div:nth-child(1) {
-            top: 8px;
-            left: 8px;
-            animation-delay: 0s;
-        }
-        
-        .loading-animation div:nth-child(2) {
-            top: 8px;
-            left: 32px;
-            animation-delay: -0.4s;
-        }
-        
-        .loading-animation div:nth-child(3) {
-            top: 32px;
-            left: 8px;
-            animation-delay: -0.8s;
-        }
-        
-        .loading-animation div:nth-child(4) {
-            top: 32px;
-            left: 32px;
-            animation-delay: -0.4s;
-        }
-        
-        @keyframes loading-animation {
-            0%, 100% {
-                opacity: 1;
-                transform: scale(1);
-            }
-            50% {
-                opacity: 0.5;
-                transform: scale(0.5);
-            }
-        }
-        
-        /* Responsive adjustments */
-        @media (max-width: 768px) {
-            .gradio-container {
-                max-width: 95% !important;
-                padding: 15px !important;
-            }
-            
-            #title {
-                font-size: 2.5em !important;
-            }
-            
-            .gr-chatbot {
-                min-height: 300px !important;
-            }
-            
-            .gr-chatbot .message {
-                max-width: 90% !important;
-            }
-        }
-        
-        /* Create dynamic background particles */
-        .gradio-container::after {
-            content: "";
-        }
-        
-        /* JavaScript to add dynamic elements */
-        <script>
-            // Add floating particles
-            function createParticles() {
-                const container = document.querySelector('.gradio-container');
-                const particleCount = 30;
-                
-                for (let i = 0; i < particleCount; i++) {
-                    const particle = document.createElement('div');
-                    particle.classList.add('particle');
-                    
-                    // Random properties
-                    const size = Math.random() * 5 + 2;
-                    const posX = Math.random() * 100;
-                    const posY = Math.random() * 100;
-                    const delay = Math.random() * 10;
-                    const duration = Math.random() * 10 + 10;
-                    
-                    // Set styles
-                    particle.style.width = `${size}px`;
-                    particle.style.height = `${size}px`;
-                    particle.style.left = `${posX}%`;
-                    particle.style.bottom = `${posY}%`;
-                    particle.style.animationDelay = `${delay}s`;
-                    particle.style.animationDuration = `${duration}s`;
-                    particle.style.background = i % 2 === 0 ? 
-                        `rgba(74, 144, 226, ${Math.random() * 0.5 + 0.1})` : 
-                        `rgba(255, 107, 107, ${Math.random() * 0.5 + 0.1})`;
-                    
-                    // Add to container
-                    container.appendChild(particle);
-                }
-            }
-            
-            // Make chat history items clickable
-            function setupChatHistoryEvents() {
-                setTimeout(() => {
-                    const chatHistoryItems = document.querySelectorAll('.chat-history-card');
-                    chatHistoryItems.forEach(item => {
-                        item.addEventListener('click', () => {
-                            // Get the chat ID from the data attribute
-                            const chatId = item.getAttribute('data-chat-id');
-                            // Trigger the click on the hidden button with this chat ID
-                            document.querySelector(`button[data-chat-id="${chatId}"]`).click();
-                        });
-                    });
-                }, 1000);
-            }
-            
-            // Call functions when DOM is loaded
-            document.addEventListener('DOMContentLoaded', () => {
-                createParticles();
-                setupChatHistoryEvents();
-            });
-        </script>
+    with gr.Blocks(title="Character Chat System", theme=gr.themes.Base(), head=f"""
+        <link rel="stylesheet" href="{static_url('app.css')}">
+        <script src="{static_url('app.js')}"></script>
     """) as iface:
         current_chat_id = gr.State(value=None)  # State to track the current chat ID
         user_id = gr.State(value=None)  # State to track user ID
@@ -928,8 +703,7 @@ def create_interface():
             sign_in_response = gr.Textbox(label="Sign In Response", interactive=False)
 
             def sign_in(user_id_input):
-                user_id.value = user_id_input
-                load_history = load_chat_history(user_id_input)
+                # The per-session user_id state is set through the click outputs
                 return f"Welcome, {user_id_input}!", user_id_input
             
             sign_in_btn.click(fn=sign_in, inputs=[user_id_input], outputs=[sign_in_response, user_id])
@@ -949,7 +723,7 @@ def create_interface():
                 )
                 
                 character_list = gr.Dataframe(
-                    value=get_existing_characters(),
+                    value=existing_characters,
                     headers=["Name", "Description"],
                     interactive=False
                 )
@@ -961,12 +735,12 @@ def create_interface():
                 
                 refresh_characters_btn.click(fn=refresh_characters, outputs=[character_list])
         
-        with gr.Tab("Chat with Character"):
+        with gr.Tab("Chat with Character", elem_id="chat-tab"):
             with gr.Row():
                 with gr.Column(scale=2):
                     character_dropdown = gr.Dropdown(
                         label="Choose Character", 
-                        choices=[char[0] for char in get_existing_characters()],
+                        choices=[char[0] for char in existing_characters],
                         interactive=True
                     )
                     user_input = gr.Textbox(label="Your Message", placeholder="Type your message or use audio input", lines=2)
@@ -984,9 +758,10 @@ def create_interface():
                     
                     chat_display = gr.Chatbot(label="Chat Responses", height=400)
                     
-                    # Hidden button to load a chat
-                    load_chat_btn = gr.Button("Load Chat", visible=False)
-                    chat_id_input = gr.Textbox(visible=False)
+                    # Hidden controls that app.js fills and clicks when a chat history card is
+                    # selected; hidden with CSS rather than visible=False so they stay in the page
+                    load_chat_btn = gr.Button("Load Chat", elem_id="load-chat-btn", elem_classes=["hidden-control"])
+                    chat_id_input = gr.Textbox(elem_id="load-chat-id", elem_classes=["hidden-control"])
 
             def auto_select(character_name, user_input):
                 selected_character = auto_select_character(user_input)
@@ -1012,20 +787,30 @@ def create_interface():
                     return transcribed_text
                 return text_input
             
-            def handle_chat(character_name, user_input, user_id_val, current_chat_id_val=None):
+            async def handle_chat(character_name, user_input, user_id_val, current_chat_id_val=None):
                 if not user_id_val:
-                    return [(None, "Please sign in first!")], None
+                    yield [(None, "Please sign in first!")], None
+                    return
                 
                 if not user_input or user_input.strip() == "":
-                    return [(None, "Please enter a message!")], current_chat_id_val
+                    yield [(None, "Please enter a message!")], current_chat_id_val
+                    return
                 
-                response, new_chat_id = chat_with_character(character_name, user_input, user_id_val, current_chat_id_val)
-                
-                # Update our chat ID if this is a new conversation
+                # Start a new conversation's ID up front so it goes out with the first chunk
                 if current_chat_id_val is None:
-                    current_chat_id_val = new_chat_id
+                    current_chat_id_val = str(uuid.uuid4())
+                
+                # Show the reply as it streams in, batching chunks between flushes
+                response = ""
+                last_flush = time.monotonic()
+                async for chunk in chat_with_character_stream(character_name, user_input, user_id_val, current_chat_id_val):
+                    response += chunk
+                    now = time.monotonic()
+                    if now - last_flush >= stream_flush_interval:
+                        last_flush = now
+                        yield [(user_input, response)], current_chat_id_val
                 
-                return [(user_input, response)], current_chat_id_val
+                yield [(user_input, response)], current_chat_id_val
             
             def load_existing_chat(chat_id, user_id_val):
                 if not user_id_val or not chat_id:
@@ -1036,8 +821,11 @@ def create_interface():
             
             auto_select_btn.click(fn=auto_select, inputs=[character_dropdown, user_input], outputs=[character_dropdown])
             
-            audio_input.change(fn=transcribe_audio, inputs=[audio_input, user_input], outputs=[user_input])
-            video_input.change(fn=transcribe_video, inputs=[video_input, user_input], outputs=[user_input])
+            # Transcribe once per finished recording or upload, not on every value change
+            audio_input.stop_recording(fn=transcribe_audio, inputs=[audio_input, user_input], outputs=[user_input])
+            audio_input.upload(fn=transcribe_audio, inputs=[audio_input, user_input], outputs=[user_input])
+            video_input.stop_recording(fn=transcribe_video, inputs=[video_input, user_input], outputs=[user_input])
+            video_input.upload(fn=transcribe_video, inputs=[video_input, user_input], outputs=[user_input])
             
             send_btn.click(
                 fn=handle_chat, 
@@ -1052,42 +840,43 @@ def create_interface():
             )
         
         with gr.Tab("Chat History"):
-            history_container = gr.HTML(load_chat_history(user_id.value) if user_id.value else "Please sign in to view your chat history.")
+            history_container = gr.HTML("Please sign in to view your chat history.")
+            history_limit = gr.State(value=chat_history_page_size)  # Number of cards currently shown
             
             def format_chat_history(history_data):
                 if not history_data:
                     return "<div class='empty-history'>No chat history available.</div>"
                 
-                html = "<div class='chat-history-container'>"
-                for chat_id, character, preview, date, msg_count in history_data:
-                    html += f"""
-                    <div class='chat-history-card' data-chat-id='{chat_id}'>
-                        <div class='chat-history-badge'>{msg_count} messages</div>
-                        <h3>{character}</h3>
-                        <p><strong>Started:</strong> {date}</p>
-                        <p><strong>First message:</strong> {preview}</p>
-                    </div>
-                    <button style='display:none;' data-chat-id='{chat_id}' id='load-chat-{chat_id}'></button>
-                    """
-                html += "</div>"
-                return html
+                # Join once instead of growing a string per card; every stored value is
+                # escaped, including the chat ID used in the quoted attributes (it may be NULL)
+                escape = html.escape
+                format_card = chat_history_card_template.format
+                return "".join([chat_history_header] + [
+                    format_card(
+                        chat_id=escape(chat_id or ""),
+                        msg_count=msg_count,
+                        character=escape(character),
+                        date=escape(date),
+                        preview=escape(preview)
+                    )
+                    for chat_id, character, preview, date, msg_count in history_data
+                ] + [chat_history_footer])
             
-            def load_chat_history(user_id_val):
+            def load_chat_history(user_id_val, limit=chat_history_page_size):
                 if not user_id_val:
-                    return "<div class='error-message'>Please sign in first to view your chat history.</div>"
+                    return "<div class='error-message'>Please sign in first to view your chat history.</div>", gr.update(visible=False), limit
                 
                 history = get_chat_history(user_id_val)
-                return format_chat_history(history)
+                # Only render the newest `limit` chats; the rest wait for "Load More"
+                return format_chat_history(history[:limit]), gr.update(visible=len(history) > limit), limit
             
-            view_history_btn = gr.Button("View History", variant="primary")
-            view_history_btn.click(fn=load_chat_history, inputs=[user_id], outputs=[history_container])
-
-            # Create hidden buttons for each chat history item
-            def setup_chat_history_buttons(history_container):
-                # This function will be executed by the JavaScript
-                return history_container
+            def load_more_history(user_id_val, limit):
+                return load_chat_history(user_id_val, limit + chat_history_page_size)
             
-            history_container.change(fn=setup_chat_history_buttons, inputs=[history_container], outputs=[history_container])
+            view_history_btn = gr.Button("View History", variant="primary")
+            load_more_btn = gr.Button("Load More", visible=False)
+            view_history_btn.click(fn=load_chat_history, inputs=[user_id], outputs=[history_container, load_more_btn, history_limit])
+            load_more_btn.click(fn=load_more_history, inputs=[user_id, history_limit], outputs=[history_container, load_more_btn, history_limit])
 
     return iface
 
@@ -1095,8 +884,14 @@ if __name__ == "__main__":
     with app.app_context():
         #db.drop_all()
         db.create_all()  # Ensure tables are created
-        add_predefined_characters()  # Add predefined characters if needed
+        # create_all skips existing tables, so add any indexes they are missing
+        for index in Conversation.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        # Seed only an empty table; later launches skip the per-name checks
+        if db.session.query(Character.id).first() is None:
+            add_predefined_characters()
     
     chat_interface = create_interface()
     logger.info("Starting Gradio interface...")
-    chat_interface.launch(share=True)
+    # Let Gradio run many chat handlers concurrently; they mostly await Gemini
+    chat_interface.queue(default_concurrency_limit=worker_concurrency).launch(share=True, max_threads=worker_concurrency)
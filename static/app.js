@@ -0,0 +1,289 @@
+// Floating particles, drawn on a single canvas instead of one animated
+// element per particle
+const PARTICLE_COUNT = 30;
+const PARTICLE_COLORS = [[74, 144, 226], [255, 107, 107]];
+
+// Per-particle fields, stored structure-of-arrays style in one Float32Array.
+// The layout doubles as the WebGL instance buffer, so the motion fields come
+// first as one vec4 and the look fields follow as one vec3.
+const P_X = 0;          // horizontal position, fraction of the viewport
+const P_Y = 1;          // starting height above the bottom, fraction of the viewport
+const P_DELAY = 2;      // seconds before the particle starts rising
+const P_DURATION = 3;   // seconds to rise one viewport height
+const P_SIZE = 4;       // diameter in CSS pixels
+const P_ALPHA = 5;
+const P_COLOR = 6;      // index into PARTICLE_COLORS
+const P_STRIDE = 7;
+
+const RANDOM_FILL_LIMIT = 16384;  // Uint32 values per getRandomValues call
+
+function createParticleData(count) {
+    const data = new Float32Array(count * P_STRIDE);
+    // Draw the random values up front, scaled to [0, 1) as they are read;
+    // getRandomValues fills at most 65536 bytes per call
+    const random = new Uint32Array(count * 6);
+    for (let start = 0; start < random.length; start += RANDOM_FILL_LIMIT) {
+        crypto.getRandomValues(random.subarray(start, start + RANDOM_FILL_LIMIT));
+    }
+    const scale = 1 / 4294967296;
+    for (let i = 0, r = 0; i < count; i++, r += 6) {
+        const o = i * P_STRIDE;
+        data[o + P_X] = random[r] * scale;
+        data[o + P_Y] = random[r + 1] * scale;
+        data[o + P_DELAY] = random[r + 2] * scale * 10;
+        data[o + P_DURATION] = random[r + 3] * scale * 10 + 10;
+        data[o + P_SIZE] = random[r + 4] * scale * 5 + 2;
+        data[o + P_ALPHA] = random[r + 5] * scale * 0.5 + 0.1;
+        data[o + P_COLOR] = i % PARTICLE_COLORS.length;
+    }
+    return data;
+}
+
+const PARTICLE_VERTEX_SHADER = `
+    attribute vec2 a_quad;
+    attribute vec4 a_motion;   // x, y, delay, duration
+    attribute vec3 a_style;    // size, alpha, colour index
+    uniform vec2 u_viewport;   // CSS pixels
+    uniform float u_time;
+    uniform vec3 u_colors[2];
+    varying vec2 v_quad;
+    varying vec4 v_color;
+
+    void main() {
+        float elapsed = max(u_time - a_motion.z, 0.0);
+        float rise = mod(elapsed, a_motion.w) / a_motion.w;
+        vec2 center = vec2(a_motion.x, a_motion.y + rise) * u_viewport;
+        vec2 position = center + a_quad * a_style.x * 0.5;
+        gl_Position = vec4(position / u_viewport * 2.0 - 1.0, 0.0, 1.0);
+        v_quad = a_quad;
+        v_color = vec4(mix(u_colors[0], u_colors[1], a_style.z), a_style.y);
+    }
+`;
+
+const PARTICLE_FRAGMENT_SHADER = `
+    precision mediump float;
+    varying vec2 v_quad;
+    varying vec4 v_color;
+
+    void main() {
+        if (dot(v_quad, v_quad) > 1.0) {
+            discard;
+        }
+        gl_FragColor = vec4(v_color.rgb * v_color.a, v_color.a);
+    }
+`;
+
+// Draws every particle as an instanced quad in a single call; all motion is
+// computed on the GPU from u_time, so a frame is one uniform update and one draw
+function createWebGLRenderer(data, count) {
+    const canvas = document.createElement('canvas');
+    const gl = canvas.getContext('webgl', { premultipliedAlpha: true });
+    const instancing = gl && gl.getExtension('ANGLE_instanced_arrays');
+    if (!instancing) {
+        return null;
+    }
+
+    function compile(type, source) {
+        const shader = gl.createShader(type);
+        gl.shaderSource(shader, source);
+        gl.compileShader(shader);
+        return gl.getShaderParameter(shader, gl.COMPILE_STATUS) ? shader : null;
+    }
+
+    const vertexShader = compile(gl.VERTEX_SHADER, PARTICLE_VERTEX_SHADER);
+    const fragmentShader = compile(gl.FRAGMENT_SHADER, PARTICLE_FRAGMENT_SHADER);
+    if (!vertexShader || !fragmentShader) {
+        return null;
+    }
+    const program = gl.createProgram();
+    gl.attachShader(program, vertexShader);
+    gl.attachShader(program, fragmentShader);
+    // Some drivers require attribute 0 to be a per-vertex (non-instanced) attribute
+    gl.bindAttribLocation(program, 0, 'a_quad');
+    gl.linkProgram(program);
+    if (!gl.getProgramParameter(program, gl.LINK_STATUS)) {
+        return null;
+    }
+    gl.useProgram(program);
+
+    const quadBuffer = gl.createBuffer();
+    gl.bindBuffer(gl.ARRAY_BUFFER, quadBuffer);
+    gl.bufferData(gl.ARRAY_BUFFER, new Float32Array([-1, -1, 1, -1, -1, 1, 1, 1]), gl.STATIC_DRAW);
+    const quadLocation = gl.getAttribLocation(program, 'a_quad');
+    gl.enableVertexAttribArray(quadLocation);
+    gl.vertexAttribPointer(quadLocation, 2, gl.FLOAT, false, 0, 0);
+
+    // Uploaded once; nothing per particle changes after this
+    const instanceBuffer = gl.createBuffer();
+    gl.bindBuffer(gl.ARRAY_BUFFER, instanceBuffer);
+    gl.bufferData(gl.ARRAY_BUFFER, data, gl.STATIC_DRAW);
+    const stride = P_STRIDE * Float32Array.BYTES_PER_ELEMENT;
+    const motionLocation = gl.getAttribLocation(program, 'a_motion');
+    gl.enableVertexAttribArray(motionLocation);
+    gl.vertexAttribPointer(motionLocation, 4, gl.FLOAT, false, stride, P_X * Float32Array.BYTES_PER_ELEMENT);
+    instancing.vertexAttribDivisorANGLE(motionLocation, 1);
+    const styleLocation = gl.getAttribLocation(program, 'a_style');
+    gl.enableVertexAttribArray(styleLocation);
+    gl.vertexAttribPointer(styleLocation, 3, gl.FLOAT, false, stride, P_SIZE * Float32Array.BYTES_PER_ELEMENT);
+    instancing.vertexAttribDivisorANGLE(styleLocation, 1);
+
+    const viewportLocation = gl.getUniformLocation(program, 'u_viewport');
+    const timeLocation = gl.getUniformLocation(program, 'u_time');
+    gl.uniform3fv(gl.getUniformLocation(program, 'u_colors'),
+        new Float32Array(PARTICLE_COLORS.flat().map(channel => channel / 255)));
+
+    gl.enable(gl.BLEND);
+    gl.blendFunc(gl.ONE, gl.ONE_MINUS_SRC_ALPHA);
+    gl.clearColor(0, 0, 0, 0);
+
+    function resize() {
+        const dpr = window.devicePixelRatio || 1;
+        const rect = canvas.getBoundingClientRect();
+        canvas.width = Math.round(rect.width * dpr);
+        canvas.height = Math.round(rect.height * dpr);
+        gl.viewport(0, 0, canvas.width, canvas.height);
+        gl.uniform2f(viewportLocation, rect.width, rect.height);
+    }
+
+    function draw(time) {
+        gl.uniform1f(timeLocation, time);
+        gl.clear(gl.COLOR_BUFFER_BIT);
+        instancing.drawArraysInstancedANGLE(gl.TRIANGLE_STRIP, 0, 4, count);
+    }
+
+    return { canvas, resize, draw };
+}
+
+// Fallback renderer: draws each particle with the 2D canvas API
+function createCanvasRenderer(data, count) {
+    const canvas = document.createElement('canvas');
+    const ctx = canvas.getContext('2d');
+    let width = 0;
+    let height = 0;
+
+    function resize() {
+        const dpr = window.devicePixelRatio || 1;
+        const rect = canvas.getBoundingClientRect();
+        width = rect.width;
+        height = rect.height;
+        canvas.width = Math.round(width * dpr);
+        canvas.height = Math.round(height * dpr);
+        ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+    }
+
+    function draw(time) {
+        ctx.clearRect(0, 0, width, height);
+        // Even particles use the first colour and odd ones the second, so
+        // drawing them in two passes needs only two fillStyle changes a frame
+        for (let color = 0; color < PARTICLE_COLORS.length; color++) {
+            ctx.fillStyle = `rgb(${PARTICLE_COLORS[color].join(', ')})`;
+            for (let i = color; i < count; i += PARTICLE_COLORS.length) {
+                const o = i * P_STRIDE;
+                const elapsed = Math.max(time - data[o + P_DELAY], 0);
+                const rise = (elapsed % data[o + P_DURATION]) / data[o + P_DURATION];
+                const x = data[o + P_X] * width;
+                const y = (1 - data[o + P_Y] - rise) * height;
+                ctx.globalAlpha = data[o + P_ALPHA];
+                ctx.beginPath();
+                ctx.arc(x, y, data[o + P_SIZE] / 2, 0, Math.PI * 2);
+                ctx.fill();
+            }
+        }
+    }
+
+    return { canvas, resize, draw };
+}
+
+function createParticles() {
+    const container = document.querySelector('.gradio-container');
+    // Gradio can re-mount the page; only ever start one particle canvas
+    if (!container || container.dataset.particlesInitialized) {
+        return;
+    }
+    container.dataset.particlesInitialized = '1';
+
+    const data = createParticleData(PARTICLE_COUNT);
+    // Fall back to 2D canvas drawing where WebGL instancing is unavailable
+    const renderer = createWebGLRenderer(data, PARTICLE_COUNT) || createCanvasRenderer(data, PARTICLE_COUNT);
+
+    renderer.canvas.classList.add('particle-canvas');
+    container.appendChild(renderer.canvas);
+    renderer.resize();
+
+    if (window.matchMedia('(prefers-reduced-motion: reduce)').matches) {
+        // A single still frame, redrawn whenever a resize clears the canvas
+        renderer.draw(0);
+        window.addEventListener('resize', () => {
+            renderer.resize();
+            renderer.draw(0);
+        });
+        return;
+    }
+    window.addEventListener('resize', renderer.resize);
+
+    let running = false;
+    let frameId = 0;
+
+    function tick(now) {
+        if (!running) {
+            return;
+        }
+        renderer.draw(now / 1000);
+        frameId = requestAnimationFrame(tick);
+    }
+
+    // Only animate while the app is on screen, to save battery when it isn't
+    new IntersectionObserver(entries => {
+        const visible = entries[0].isIntersecting;
+        if (visible && !running) {
+            running = true;
+            frameId = requestAnimationFrame(tick);
+        } else if (!visible && running) {
+            running = false;
+            cancelAnimationFrame(frameId);
+        }
+    }).observe(container);
+}
+
+// Make chat history items clickable with one delegated listener on the
+// document. It covers cards Gradio renders at any later point, so it is
+// installed immediately rather than waiting for the DOM or polling for cards.
+function installHistoryDelegation() {
+    const root = document.documentElement;
+    if (root.dataset.historyDelegation) {
+        return;  // Already installed, e.g. if Gradio re-injects this script
+    }
+    root.dataset.historyDelegation = '1';
+
+    document.addEventListener('click', event => {
+        const card = event.target.closest('.chat-history-card');
+        if (!card) {
+            return;
+        }
+        // Hand the chat ID to the hidden Gradio controls wired to load_existing_chat
+        const input = document.querySelector('#load-chat-id textarea, #load-chat-id input');
+        const button = document.getElementById('load-chat-btn');
+        if (!input || !button) {
+            return;
+        }
+        input.value = card.dataset.chatId;
+        input.dispatchEvent(new Event('input', { bubbles: true }));
+        button.click();
+
+        // Switch to the chat tab so the loaded conversation is visible
+        const chatTab = document.getElementById('chat-tab-button');
+        if (chatTab) {
+            chatTab.click();
+        }
+    });
+}
+
+installHistoryDelegation();
+
+// Start the particles once the DOM is loaded; Gradio may inject this script
+// after DOMContentLoaded has already fired
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', createParticles);
+} else {
+    createParticles();
+}